@@ -1,36 +1,29 @@
+import os, glob, json
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import plotly.offline as pyo
+import plotly.io as pio
 from datetime import datetime
+import duty_data
+from duty_data import DAY_ORDER, read_duty_csvs, add_date_time, add_hour_and_weekday, status_crosstab, status_counts_nonzero, input_files_key, replace_file, remove_stale_files
 
-def create_html_dashboard():
-    """Create an HTML dashboard with interactive charts"""
-    
-    # Load data - use relative paths and support multiple input CSVs
-    import os, glob
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    pattern = os.path.join(current_dir, 'Untitled spreadsheet - Sheet*.csv')
-    files = sorted(glob.glob(pattern))
-    if not files:
-        raise FileNotFoundError(f"No CSV files found matching: {pattern}")
+# Input/output locations, resolved once relative to this script
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+CSV_PATTERN = os.path.join(CURRENT_DIR, 'Untitled spreadsheet - Sheet*.csv')
+WORK_HOURS_FILE = os.path.join(CURRENT_DIR, 'employee_work_hours.csv')
 
-    parts = []
-    for csv_file in files:
-        parts.append(pd.read_csv(csv_file, names=['ID', 'Name', 'Status', 'DateTime']))
-    df = pd.concat(parts, ignore_index=True)
+def build_dashboard_parts(files, work_hours_file):
+    """Aggregate the input CSVs into the chart markup, summary table and headline metrics"""
+    
+    df = add_hour_and_weekday(add_date_time(read_duty_csvs(files)))
     
-    # Convert DateTime to datetime object
-    df['DateTime'] = pd.to_datetime(df['DateTime'])
-    df['Date'] = df['DateTime'].dt.date
-    df['Time'] = df['DateTime'].dt.time
-    df['Hour'] = df['DateTime'].dt.hour
-    df['DayOfWeek'] = df['DateTime'].dt.day_name()
+    # Status is already categorical from the Arrow dictionary; Name gets sorted categories
+    df['Name'] = df['Name'].astype('category')
     
     # Load work hours data
     try:
-        work_hours_file = os.path.join(current_dir, 'employee_work_hours.csv')
         work_hours_df = pd.read_csv(work_hours_file)
     except:
         work_hours_df = None
@@ -46,62 +39,55 @@ def create_html_dashboard():
                [{"secondary_y": False}, {"secondary_y": False}]]
     )
     
-    # Chart 1: Daily Activity
-    daily_stats = df.groupby(['Date', 'Status']).size().reset_index(name='Count')
-    duty_on_daily = daily_stats[daily_stats['Status'] == 'DutyOn']
-    duty_off_daily = daily_stats[daily_stats['Status'] == 'DutyOff']
+    # Per-status counts for every grouping key, one pass per key
+    by_date = status_crosstab(df, 'Date').sort_index()
+    by_hour = status_crosstab(df, 'Hour').sort_index()
+    by_dow = status_crosstab(df, 'DayOfWeek').reindex(DAY_ORDER, fill_value=0)
+    by_name = status_crosstab(df, 'Name').sort_index()
     
+    # Chart 1: Daily Activity (each status series skips keys without records for it)
+    duty_on, duty_off = status_counts_nonzero(by_date, 'DutyOn'), status_counts_nonzero(by_date, 'DutyOff')
     fig.add_trace(
-        go.Bar(x=duty_on_daily['Date'], y=duty_on_daily['Count'], 
+        go.Bar(x=duty_on.index, y=duty_on, 
                name='Duty On', marker_color='#2E8B57'),
         row=1, col=1
     )
     fig.add_trace(
-        go.Bar(x=duty_off_daily['Date'], y=duty_off_daily['Count'], 
+        go.Bar(x=duty_off.index, y=duty_off, 
                name='Duty Off', marker_color='#DC143C'),
         row=1, col=1
     )
     
     # Chart 2: Employee Activity
-    employee_stats = df['Name'].value_counts().head(15)
+    employee_stats = by_name.sum(axis=1).nlargest(15)
     fig.add_trace(
         go.Bar(x=employee_stats.values, y=employee_stats.index, 
                orientation='h', name='Total Records', marker_color='#4169E1'),
         row=1, col=2
     )
     
-    # Chart 3: Hourly Pattern
-    hourly_stats = df.groupby(['Hour', 'Status']).size().reset_index(name='Count')
-    hourly_on = hourly_stats[hourly_stats['Status'] == 'DutyOn']
-    hourly_off = hourly_stats[hourly_stats['Status'] == 'DutyOff']
-    
+    # Chart 3: Hourly Pattern (WebGL traces)
+    duty_on, duty_off = status_counts_nonzero(by_hour, 'DutyOn'), status_counts_nonzero(by_hour, 'DutyOff')
     fig.add_trace(
-        go.Scatter(x=hourly_on['Hour'], y=hourly_on['Count'], 
-                  mode='lines+markers', name='Duty On (Hourly)', line_color='#2E8B57'),
+        go.Scattergl(x=duty_on.index, y=duty_on, 
+                    mode='lines+markers', name='Duty On (Hourly)', line_color='#2E8B57'),
         row=2, col=1
     )
     fig.add_trace(
-        go.Scatter(x=hourly_off['Hour'], y=hourly_off['Count'], 
-                  mode='lines+markers', name='Duty Off (Hourly)', line_color='#DC143C'),
+        go.Scattergl(x=duty_off.index, y=duty_off, 
+                    mode='lines+markers', name='Duty Off (Hourly)', line_color='#DC143C'),
         row=2, col=1
     )
     
     # Chart 4: Day of Week
-    dow_stats = df.groupby(['DayOfWeek', 'Status']).size().reset_index(name='Count')
-    day_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-    dow_stats['DayOfWeek'] = pd.Categorical(dow_stats['DayOfWeek'], categories=day_order, ordered=True)
-    dow_stats = dow_stats.sort_values('DayOfWeek')
-    
-    dow_on = dow_stats[dow_stats['Status'] == 'DutyOn']
-    dow_off = dow_stats[dow_stats['Status'] == 'DutyOff']
-    
+    duty_on, duty_off = status_counts_nonzero(by_dow, 'DutyOn'), status_counts_nonzero(by_dow, 'DutyOff')
     fig.add_trace(
-        go.Bar(x=dow_on['DayOfWeek'], y=dow_on['Count'], 
+        go.Bar(x=duty_on.index, y=duty_on, 
                name='Duty On (DoW)', marker_color='#2E8B57'),
         row=2, col=2
     )
     fig.add_trace(
-        go.Bar(x=dow_off['DayOfWeek'], y=dow_off['Count'], 
+        go.Bar(x=duty_off.index, y=duty_off, 
                name='Duty Off (DoW)', marker_color='#DC143C'),
         row=2, col=2
     )
@@ -116,13 +102,22 @@ def create_html_dashboard():
         )
         
         # Average Work Hours by Employee
-        avg_hours = work_hours_df.groupby('Name')['Work_Hours'].mean().sort_values(ascending=False).head(15)
+        avg_hours = work_hours_df.groupby('Name', sort=False)['Work_Hours'].mean().nlargest(15)
         fig.add_trace(
             go.Bar(x=avg_hours.values, y=avg_hours.index, 
                    orientation='h', name='Avg Work Hours', marker_color='#32CD32'),
             row=3, col=2
         )
     
+    # Employee summary table: record and day counts from one groupby pass, rendered in one call
+    employee_summary = df.groupby('Name', observed=True, sort=False).agg(
+        Total=('ID', 'size'),
+        Days=('Date', 'nunique')
+    ).join(by_name[['DutyOn', 'DutyOff']]).sort_index().reset_index()
+    employee_summary = employee_summary[['Name', 'Total', 'DutyOn', 'DutyOff', 'Days']]
+    employee_summary.columns = ['Employee', 'Total Records', 'Duty On', 'Duty Off', 'Unique Days']
+    summary_html = employee_summary.to_html(index=False, border=0, justify='left')
+    
     # Update layout
     fig.update_layout(
         height=1200,
@@ -132,13 +127,60 @@ def create_html_dashboard():
         showlegend=True
     )
     
-    # Generate HTML content
-    html_content = f"""
+    return {
+        'fig_div': pio.to_html(fig, include_plotlyjs='cdn', full_html=False,
+                               div_id='main-charts', config={'responsive': True}),
+        'summary_html': summary_html,
+        'metrics': {
+            'total_records': len(df),
+            'unique_employees': int(df['Name'].nunique()),
+            'duty_on': int(by_name['DutyOn'].sum()),
+            'duty_off': int(by_name['DutyOff'].sum()),
+            'days_tracked': (df['Date'].max() - df['Date'].min()).days + 1
+        }
+    }
+
+def create_html_dashboard():
+    """Create an HTML dashboard with interactive charts"""
+    
+    # Load data - use relative paths and support multiple input CSVs
+    files = sorted(glob.glob(CSV_PATTERN))
+    if not files:
+        raise FileNotFoundError(f"No CSV files found matching: {CSV_PATTERN}")
+    
+    # Reuse the aggregates and figure from a previous run if no input (or the code) has changed
+    cache_inputs = [os.path.abspath(__file__), duty_data.__file__] + files
+    if os.path.exists(WORK_HOURS_FILE):
+        cache_inputs.append(WORK_HOURS_FILE)
+    cache_file = os.path.join(CURRENT_DIR, '.cache', f"html-dashboard-{input_files_key(cache_inputs)}.json")
+    dashboard = None
+    if os.path.exists(cache_file):
+        try:
+            with open(cache_file) as f:
+                dashboard = json.load(f)
+        except ValueError:
+            dashboard = None  # unreadable cache entry, rebuild it
+    if dashboard is None:
+        dashboard = build_dashboard_parts(files, WORK_HOURS_FILE)
+        
+        def write_cache(path):
+            with open(path, 'w') as f:
+                json.dump(dashboard, f)
+        
+        # Write through a temp file so an interrupted run never leaves a truncated entry,
+        # then drop the entries for older inputs
+        replace_file(cache_file, write_cache)
+        remove_stale_files(os.path.join(CURRENT_DIR, '.cache', 'html-dashboard-*.json'), cache_file)
+    metrics = dashboard['metrics']
+    
+    # Generate HTML content as a list of pieces joined once at the end;
+    # the chart and table markup are appended as-is rather than copied through the template
+    html_parts = []
+    html_parts.append(f"""
     <!DOCTYPE html>
     <html>
     <head>
         <title>Duty Schedule Dashboard</title>
-        <script src="https://cdn.plot.ly/plotly-latest.min.js"></script>
         <style>
             body {{
                 font-family: 'Arial', sans-serif;
@@ -221,89 +263,47 @@ def create_html_dashboard():
         
         <div class="metrics">
             <div class="metric-card">
-                <div class="metric-value">{len(df):,}</div>
+                <div class="metric-value">{metrics['total_records']:,}</div>
                 <div class="metric-label">Total Records</div>
             </div>
             <div class="metric-card">
-                <div class="metric-value">{df['Name'].nunique()}</div>
+                <div class="metric-value">{metrics['unique_employees']}</div>
                 <div class="metric-label">Unique Employees</div>
             </div>
             <div class="metric-card">
-                <div class="metric-value">{len(df[df['Status'] == 'DutyOn']):,}</div>
+                <div class="metric-value">{metrics['duty_on']:,}</div>
                 <div class="metric-label">Duty On Records</div>
             </div>
             <div class="metric-card">
-                <div class="metric-value">{len(df[df['Status'] == 'DutyOff']):,}</div>
+                <div class="metric-value">{metrics['duty_off']:,}</div>
                 <div class="metric-label">Duty Off Records</div>
             </div>
             <div class="metric-card">
-                <div class="metric-value">{(df['Date'].max() - df['Date'].min()).days + 1}</div>
+                <div class="metric-value">{metrics['days_tracked']}</div>
                 <div class="metric-label">Days Tracked</div>
             </div>
         </div>
         
         <div class="chart-container">
-            <div id="main-charts"></div>
+    """)
+    html_parts.append(dashboard['fig_div'])
+    html_parts.append("""
         </div>
         
         <div class="summary-table">
             <h3>📋 Employee Summary</h3>
-            <table>
-                <tr>
-                    <th>Employee</th>
-                    <th>Total Records</th>
-                    <th>Duty On</th>
-                    <th>Duty Off</th>
-                    <th>Unique Days</th>
-                </tr>
-    """
-    
-    # Add employee summary table
-    employee_summary = df.groupby('Name').agg({
-        'Status': 'count',
-        'Date': 'nunique'
-    }).reset_index()
-    
-    duty_on_counts = df[df['Status'] == 'DutyOn'].groupby('Name').size()
-    duty_off_counts = df[df['Status'] == 'DutyOff'].groupby('Name').size()
-    
-    for _, row in employee_summary.iterrows():
-        name = row['Name']
-        total = row['Status']
-        days = row['Date']
-        duty_on = duty_on_counts.get(name, 0)
-        duty_off = duty_off_counts.get(name, 0)
-        
-        html_content += f"""
-                <tr>
-                    <td>{name}</td>
-                    <td>{total}</td>
-                    <td>{duty_on}</td>
-                    <td>{duty_off}</td>
-                    <td>{days}</td>
-                </tr>
-        """
-    
-    html_content += """
-            </table>
+    """)
+    html_parts.append(dashboard['summary_html'])
+    html_parts.append("""
         </div>
-        
-        <script>
-    """
-    
-    # Add the plotly chart
-    html_content += f"var fig = {fig.to_json()};"
-    html_content += """
-            Plotly.newPlot('main-charts', fig.data, fig.layout);
-        </script>
     </body>
     </html>
-    """
+    """)
     
     # Save HTML file
-    output_file = os.path.join(current_dir, 'duty_dashboard.html')
+    output_file = os.path.join(CURRENT_DIR, 'duty_dashboard.html')
     with open(output_file, 'w') as f:
-        f.write(html_content)
+        f.write(''.join(html_parts))
     
     print("✅ HTML Dashboard created: duty_dashboard.html")
     print("✅ Interactive charts and metrics included")
@@ -1,3 +1,4 @@
+import os, glob
 import streamlit as st
 import pandas as pd
 import plotly.express as px
@@ -7,6 +8,7 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 from datetime import datetime, timedelta
 import numpy as np
+from duty_data import DAY_ORDER, read_duty_csvs, add_date_time, add_hour_and_weekday, status_crosstab, status_counts_long
 
 # Set page config
 st.set_page_config(
@@ -37,29 +39,33 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Input/output locations, resolved once relative to this script
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+CSV_PATTERN = os.path.join(CURRENT_DIR, 'Untitled spreadsheet - Sheet*.csv')
+WORK_HOURS_FILE = os.path.join(CURRENT_DIR, 'employee_work_hours.csv')
+
+# Rows rendered in the Raw Data tab; the download button always has the full filtered data
+MAX_DISPLAY_ROWS = 1000
+
+# Date is stored as datetime64; show it without the midnight time component
+DATE_COLUMN_CONFIG = {'Date': st.column_config.DateColumn('Date')}
+
 @st.cache_data
 def load_data():
     """Load and process the duty schedule data"""
     try:
         # Load all matching CSV files (support multiple Untitled spreadsheet files)
-        import os, glob
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        pattern = os.path.join(current_dir, 'Untitled spreadsheet - Sheet*.csv')
-        files = sorted(glob.glob(pattern))
+        files = sorted(glob.glob(CSV_PATTERN))
         if not files:
-            raise FileNotFoundError(f"No CSV files found matching: {pattern}")
+            raise FileNotFoundError(f"No CSV files found matching: {CSV_PATTERN}")
 
-        parts = []
-        for csv_file in files:
-            parts.append(pd.read_csv(csv_file, names=['ID', 'Name', 'Status', 'DateTime']))
-        df = pd.concat(parts, ignore_index=True)
+        df = add_hour_and_weekday(add_date_time(read_duty_csvs(files)))
         
-        # Convert DateTime to datetime object
-        df['DateTime'] = pd.to_datetime(df['DateTime'])
-        df['Date'] = df['DateTime'].dt.date
-        df['Time'] = df['DateTime'].dt.time
-        df['Hour'] = df['DateTime'].dt.hour
-        df['DayOfWeek'] = df['DateTime'].dt.day_name()
+        # Status is already categorical from the Arrow dictionary; Name gets sorted categories
+        df['Name'] = df['Name'].astype('category')
+        
+        # Keep rows in time order so date ranges can be sliced with a binary search
+        df = df.sort_values('DateTime', kind='stable').reset_index(drop=True)
         
         return df
     except Exception as e:
@@ -70,16 +76,64 @@ def load_data():
 def load_work_hours():
     """Load the work hours data"""
     try:
-        import os
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        work_hours_file = os.path.join(current_dir, 'employee_work_hours.csv')
-        if not os.path.exists(work_hours_file):
+        if not os.path.exists(WORK_HOURS_FILE):
             return None
-        return pd.read_csv(work_hours_file)
+        return pd.read_csv(WORK_HOURS_FILE)
     except Exception as e:
         st.error(f"Error loading work hours data: {e}")
         return None
 
+@st.cache_data
+def top_average_work_hours():
+    """Top 15 employees by average work hours, computed once per work hours load"""
+    work_hours_df = load_work_hours()
+    if work_hours_df is None:
+        return None
+    return work_hours_df.groupby('Name', sort=False)['Work_Hours'].mean().nlargest(15)
+
+# The cached helpers below take the filtered frame as an unhashed _ argument and are keyed
+# on filter_key (data token plus sidebar filter values), which fully determines that frame.
+# Each distinct filter combination adds an entry, so the caches keep only the most recent ones
+FILTER_CACHE_ENTRIES = 32
+
+@st.cache_data(show_spinner=False, max_entries=FILTER_CACHE_ENTRIES)
+def compute_aggregates(_filtered_df, filter_key):
+    """Per-status counts for the filtered data"""
+    return {
+        'by_date': status_crosstab(_filtered_df, 'Date').sort_index(),
+        'by_hour': status_crosstab(_filtered_df, 'Hour').sort_index(),
+        'by_dow': status_crosstab(_filtered_df, 'DayOfWeek').reindex(DAY_ORDER, fill_value=0),
+        'by_name': status_crosstab(_filtered_df, 'Name').sort_index()
+    }
+
+@st.cache_data(show_spinner=False, max_entries=FILTER_CACHE_ENTRIES)
+def compute_daily_summary(_filtered_df, filter_key):
+    """Per-date employee, record and duty on/off counts for the Daily Summary tab"""
+    by_date = compute_aggregates(_filtered_df, filter_key)['by_date']
+    # Duty on/off counts are joined on the shared Date index
+    return _filtered_df.groupby('Date', sort=False).agg(
+        Unique_Employees=('Name', 'nunique'),
+        Total_Records=('Status', 'count')
+    ).join(by_date[['DutyOn', 'DutyOff']].set_axis(['Duty_On_Count', 'Duty_Off_Count'], axis=1)).reset_index()
+
+@st.cache_data(show_spinner=False, max_entries=FILTER_CACHE_ENTRIES)
+def compute_employee_summary(_filtered_df, filter_key):
+    """Per-employee activity span and duty on/off counts for the Employee Summary tab"""
+    by_name = compute_aggregates(_filtered_df, filter_key)['by_name']
+    # Duty on/off counts are joined on the shared Name index
+    return _filtered_df.groupby('Name', observed=True, sort=False).agg(
+        Unique_Days=('Date', 'nunique'),
+        Total_Records=('Status', 'count'),
+        First_Activity=('DateTime', 'min'),
+        Last_Activity=('DateTime', 'max')
+    ).join(by_name[['DutyOn', 'DutyOff']].set_axis(['Duty_On_Count', 'Duty_Off_Count'], axis=1)).sort_index().reset_index()
+
+# Each entry is a full encoded CSV, so only the last few downloads are kept
+@st.cache_data(show_spinner=False, max_entries=4)
+def filtered_csv(_filtered_df, filter_key):
+    """Encoded CSV of the filtered records for the download button"""
+    return _filtered_df.to_csv(index=False).encode('utf-8')
+
 def main():
     st.title("📊 Duty Schedule Dashboard")
     st.markdown("---")
@@ -92,12 +146,15 @@ def main():
         st.error("Failed to load data. Please check if the CSV file exists.")
         return
     
+    # Cheap identity for the loaded data, so cached helpers need not hash the whole frame
+    df_token = (len(df), int(df['DateTime'].iloc[0].value), int(df['DateTime'].iloc[-1].value))
+    
     # Sidebar filters
     st.sidebar.header("🔍 Filters")
     
-    # Date range filter
-    min_date = df['Date'].min()
-    max_date = df['Date'].max()
+    # Date range filter - df is sorted by DateTime, so the bounds are the first and last rows
+    min_date = df['Date'].iloc[0].date()
+    max_date = df['Date'].iloc[-1].date()
     
     date_range = st.sidebar.date_input(
         "Select Date Range",
@@ -107,7 +164,8 @@ def main():
     )
     
     # Employee filter
-    all_employees = ['All'] + sorted(df['Name'].unique().tolist())
+    # Name categories are already sorted, so no per-rerun unique + sort is needed
+    all_employees = ['All'] + df['Name'].cat.categories.tolist()
     selected_employees = st.sidebar.multiselect(
         "Select Employees",
         options=all_employees,
@@ -121,15 +179,15 @@ def main():
     )
     
     # Apply filters
-    filtered_df = df.copy()
+    filtered_df = df
     
-    # Date filter
+    # Date filter - df is sorted by DateTime, so the range is one contiguous slice
     if len(date_range) == 2:
         start_date, end_date = date_range
-        filtered_df = filtered_df[
-            (filtered_df['Date'] >= start_date) & 
-            (filtered_df['Date'] <= end_date)
-        ]
+        timestamps = df['DateTime'].to_numpy(dtype='datetime64[ns]')
+        lo = timestamps.searchsorted(np.datetime64(start_date, 'ns'))
+        hi = timestamps.searchsorted(np.datetime64(end_date + timedelta(days=1), 'ns'))
+        filtered_df = df.iloc[lo:hi]
     
     # Employee filter
     if 'All' not in selected_employees and selected_employees:
@@ -142,6 +200,10 @@ def main():
     # Key Metrics Row
     st.header("📈 Key Metrics")
     
+    # One pass over Status and one reduction over Date for the whole row
+    status_counts = filtered_df['Status'].value_counts()
+    date_min, date_max = filtered_df['Date'].agg(['min', 'max'])
+    
     col1, col2, col3, col4, col5 = st.columns(5)
     
     with col1:
@@ -153,27 +215,33 @@ def main():
         st.metric("Unique Employees", unique_employees)
     
     with col3:
-        duty_on_count = len(filtered_df[filtered_df['Status'] == 'DutyOn'])
+        duty_on_count = int(status_counts.get('DutyOn', 0))
         st.metric("Duty On Records", f"{duty_on_count:,}")
     
     with col4:
-        duty_off_count = len(filtered_df[filtered_df['Status'] == 'DutyOff'])
+        duty_off_count = int(status_counts.get('DutyOff', 0))
         st.metric("Duty Off Records", f"{duty_off_count:,}")
     
     with col5:
-        date_range_days = (filtered_df['Date'].max() - filtered_df['Date'].min()).days + 1
+        date_range_days = (date_max - date_min).days + 1
         st.metric("Date Range (Days)", date_range_days)
     
     st.markdown("---")
     
+    # Per-status counts shared by the charts and summary tables below
+    filter_key = (df_token, tuple(date_range), tuple(selected_employees), status_filter)
+    aggregates = compute_aggregates(filtered_df, filter_key)
+    by_date = aggregates['by_date']
+    by_hour = aggregates['by_hour']
+    by_dow = aggregates['by_dow']
+    by_name = aggregates['by_name']
+    
     # Charts Row 1
     col1, col2 = st.columns(2)
     
     with col1:
         st.subheader("📅 Daily Duty Activity")
-        daily_stats = filtered_df.groupby(['Date', 'Status']).size().reset_index(name='Count')
-        
-        fig = px.bar(daily_stats, 
+        fig = px.bar(status_counts_long(by_date, 'Date'), 
                     x='Date', 
                     y='Count', 
                     color='Status',
@@ -184,7 +252,7 @@ def main():
     
     with col2:
         st.subheader("👥 Employee Activity Distribution")
-        employee_stats = filtered_df['Name'].value_counts().head(15)
+        employee_stats = by_name.sum(axis=1).nlargest(15)
         
         fig = px.bar(x=employee_stats.values, 
                     y=employee_stats.index,
@@ -199,28 +267,20 @@ def main():
     
     with col1:
         st.subheader("🕐 Hourly Activity Pattern")
-        hourly_stats = filtered_df.groupby(['Hour', 'Status']).size().reset_index(name='Count')
-        
-        fig = px.line(hourly_stats, 
+        fig = px.line(status_counts_long(by_hour, 'Hour'), 
                      x='Hour', 
                      y='Count', 
                      color='Status',
                      title="Hourly Activity Pattern",
                      markers=True,
+                     render_mode='webgl',
                      color_discrete_map={'DutyOn': '#2E8B57', 'DutyOff': '#DC143C'})
         fig.update_layout(height=400)
         st.plotly_chart(fig, width="stretch")
     
     with col2:
         st.subheader("📆 Day of Week Analysis")
-        dow_stats = filtered_df.groupby(['DayOfWeek', 'Status']).size().reset_index(name='Count')
-        
-        # Order days properly
-        day_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-        dow_stats['DayOfWeek'] = pd.Categorical(dow_stats['DayOfWeek'], categories=day_order, ordered=True)
-        dow_stats = dow_stats.sort_values('DayOfWeek')
-        
-        fig = px.bar(dow_stats, 
+        fig = px.bar(status_counts_long(by_dow, 'DayOfWeek'), 
                     x='DayOfWeek', 
                     y='Count', 
                     color='Status',
@@ -238,7 +298,7 @@ def main():
         
         with col1:
             st.subheader("📊 Average Work Hours by Employee")
-            avg_hours = work_hours_df.groupby('Name')['Work_Hours'].mean().sort_values(ascending=False).head(15)
+            avg_hours = top_average_work_hours()
             
             fig = px.bar(x=avg_hours.values,
                         y=avg_hours.index,
@@ -284,7 +344,7 @@ def main():
     # Employee selector
     selected_employee = st.selectbox(
         "🔍 Select an Employee to View Detailed Schedule:",
-        options=['Select an employee...'] + sorted(filtered_df['Name'].unique().tolist()),
+        options=['Select an employee...'] + by_name.index.tolist(),
         key="employee_selector"
     )
     
@@ -304,49 +364,34 @@ def main():
                 st.metric("Days Worked", unique_days)
             
             with col3:
-                duty_on_count = len(employee_data[employee_data['Status'] == 'DutyOn'])
+                duty_on_count = int(by_name.at[selected_employee, 'DutyOn'])
                 st.metric("Duty On Records", duty_on_count)
             
             with col4:
-                duty_off_count = len(employee_data[employee_data['Status'] == 'DutyOff'])
+                duty_off_count = int(by_name.at[selected_employee, 'DutyOff'])
                 st.metric("Duty Off Records", duty_off_count)
             
             # Create detailed schedule table
             st.subheader(f"📅 Detailed Schedule for {selected_employee}")
             
-            # Group by date and create a comprehensive view
-            schedule_data = []
-            for date in sorted(employee_data['Date'].unique()):
-                date_records = employee_data[employee_data['Date'] == date].sort_values('DateTime')
-                
-                duty_on_records = date_records[date_records['Status'] == 'DutyOn']
-                duty_off_records = date_records[date_records['Status'] == 'DutyOff']
-                
-                # Get duty on times
-                duty_on_times = duty_on_records['Time'].tolist() if not duty_on_records.empty else ['N/A']
-                duty_off_times = duty_off_records['Time'].tolist() if not duty_off_records.empty else ['N/A']
-                
-                # Calculate work duration if both exist
-                work_duration = "N/A"
-                if not duty_on_records.empty and not duty_off_records.empty:
-                    first_on = duty_on_records.iloc[0]['DateTime']
-                    last_off = duty_off_records.iloc[-1]['DateTime']
-                    duration = last_off - first_on
-                    hours = duration.total_seconds() / 3600
-                    work_duration = f"{hours:.2f} hours"
-                
-                schedule_data.append({
-                    'Date': date,
-                    'Name': selected_employee,
-                    'Duty On': ', '.join([str(t) for t in duty_on_times]),
-                    'Duty Off': ', '.join([str(t) for t in duty_off_times]),
-                    'Work Duration': work_duration,
-                    'Total Records': len(date_records)
-                })
+            # Records are already in time order, so each per-date groupby comes out chronological
+            duty_on_records = employee_data[employee_data['Status'] == 'DutyOn'].groupby('Date', sort=False)
+            duty_off_records = employee_data[employee_data['Status'] == 'DutyOff'].groupby('Date', sort=False)
+            date_records = employee_data.groupby('Date', sort=False).size()
+            
+            # Work duration runs from the first duty on to the last duty off of each day
+            hours = (duty_off_records['DateTime'].max() - duty_on_records['DateTime'].min()).dt.total_seconds() / 3600
+            
+            schedule_df = pd.DataFrame({
+                'Name': selected_employee,
+                'Duty On': duty_on_records['Time'].agg(lambda times: ', '.join(map(str, times))),
+                'Duty Off': duty_off_records['Time'].agg(lambda times: ', '.join(map(str, times))),
+                'Work Duration': hours.map('{:.2f} hours'.format, na_action='ignore'),
+                'Total Records': date_records
+            }, index=date_records.index).fillna('N/A').reset_index()
             
             # Display as DataFrame
-            schedule_df = pd.DataFrame(schedule_data)
-            st.dataframe(schedule_df, width='stretch')
+            st.dataframe(schedule_df, width='stretch', column_config=DATE_COLUMN_CONFIG)
             
             # Download button for individual employee data
             csv = schedule_df.to_csv(index=False)
@@ -362,9 +407,9 @@ def main():
             
             with col1:
                 st.subheader("📊 Daily Activity Pattern")
-                daily_activity = employee_data.groupby(['Date', 'Status']).size().reset_index(name='Count')
+                daily_activity = status_crosstab(employee_data, 'Date')
                 
-                fig = px.bar(daily_activity, 
+                fig = px.bar(status_counts_long(daily_activity, 'Date'), 
                             x='Date', 
                             y='Count', 
                             color='Status',
@@ -375,14 +420,15 @@ def main():
             
             with col2:
                 st.subheader("🕐 Hourly Activity Pattern")
-                hourly_activity = employee_data.groupby(['Hour', 'Status']).size().reset_index(name='Count')
+                hourly_activity = status_crosstab(employee_data, 'Hour').sort_index()
                 
-                fig = px.line(hourly_activity, 
+                fig = px.line(status_counts_long(hourly_activity, 'Hour'), 
                              x='Hour', 
                              y='Count', 
                              color='Status',
                              title=f"Hourly Pattern for {selected_employee}",
                              markers=True,
+                             render_mode='webgl',
                              color_discrete_map={'DutyOn': '#2E8B57', 'DutyOff': '#DC143C'})
                 fig.update_layout(height=400)
                 st.plotly_chart(fig, width='stretch')
@@ -397,7 +443,8 @@ def main():
                                  x='Date', 
                                  y='Work_Hours',
                                  title=f"Work Hours Trend for {selected_employee}",
-                                 markers=True)
+                                 markers=True,
+                                 render_mode='webgl')
                     fig.add_hline(y=employee_work_hours['Work_Hours'].mean(), 
                                  line_dash="dash", 
                                  line_color="red",
@@ -415,10 +462,12 @@ def main():
     
     with tab1:
         st.subheader("Filtered Raw Data")
-        st.dataframe(filtered_df, width="stretch")
+        st.dataframe(filtered_df.head(MAX_DISPLAY_ROWS), width="stretch", column_config=DATE_COLUMN_CONFIG)
+        if len(filtered_df) > MAX_DISPLAY_ROWS:
+            st.caption(f"Showing first {MAX_DISPLAY_ROWS:,} of {len(filtered_df):,} rows - download the CSV for the full data")
         
         # Download button
-        csv = filtered_df.to_csv(index=False)
+        csv = filtered_csv(filtered_df, filter_key)
         st.download_button(
             label="📥 Download Filtered Data as CSV",
             data=csv,
@@ -428,39 +477,12 @@ def main():
     
     with tab2:
         st.subheader("Daily Summary")
-        daily_summary = filtered_df.groupby('Date').agg({
-            'Name': 'nunique',
-            'Status': ['count']
-        }).round(2)
-        daily_summary.columns = ['Unique_Employees', 'Total_Records']
-        daily_summary = daily_summary.reset_index()
-        
-        # Add duty on/off counts
-        duty_on_daily = filtered_df[filtered_df['Status'] == 'DutyOn'].groupby('Date').size()
-        duty_off_daily = filtered_df[filtered_df['Status'] == 'DutyOff'].groupby('Date').size()
-        
-        daily_summary['Duty_On_Count'] = daily_summary['Date'].map(duty_on_daily).fillna(0).astype(int)
-        daily_summary['Duty_Off_Count'] = daily_summary['Date'].map(duty_off_daily).fillna(0).astype(int)
-        
-        st.dataframe(daily_summary, width="stretch")
+        daily_summary = compute_daily_summary(filtered_df, filter_key)
+        st.dataframe(daily_summary, width="stretch", column_config=DATE_COLUMN_CONFIG)
     
     with tab3:
         st.subheader("Employee Summary")
-        employee_summary = filtered_df.groupby('Name').agg({
-            'Date': 'nunique',
-            'Status': 'count',
-            'DateTime': ['min', 'max']
-        }).round(2)
-        employee_summary.columns = ['Unique_Days', 'Total_Records', 'First_Activity', 'Last_Activity']
-        employee_summary = employee_summary.reset_index()
-        
-        # Add duty on/off counts
-        duty_on_emp = filtered_df[filtered_df['Status'] == 'DutyOn'].groupby('Name').size()
-        duty_off_emp = filtered_df[filtered_df['Status'] == 'DutyOff'].groupby('Name').size()
-        
-        employee_summary['Duty_On_Count'] = employee_summary['Name'].map(duty_on_emp).fillna(0).astype(int)
-        employee_summary['Duty_Off_Count'] = employee_summary['Name'].map(duty_off_emp).fillna(0).astype(int)
-        
+        employee_summary = compute_employee_summary(filtered_df, filter_key)
         st.dataframe(employee_summary, width="stretch")
 
 if __name__ == "__main__":
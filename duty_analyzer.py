@@ -1,6 +1,63 @@
+import numpy as np
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import io
 import os
+import sys
+import duty_data
+from duty_data import read_duty_csvs, input_files_key, replace_file
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+CSV_PATTERN = os.path.join(CURRENT_DIR, 'Untitled spreadsheet - Sheet*.csv')
+REPORT_FILES = [os.path.join(CURRENT_DIR, name) for name in (
+    'duty_schedule_by_person.csv',
+    'duty_schedule_by_date.csv',
+    'daily_duty_summary.csv',
+    'employee_work_hours.csv',
+)]
+
+# Written after all reports succeed; records which inputs they were built from
+MANIFEST_FILE = os.path.join(CURRENT_DIR, '.cache', 'duty_reports.manifest')
+
+def reports_manifest(source_files):
+    """Key of the inputs and code (path, mtime, size), followed by the key of the reports themselves"""
+    code_files = [os.path.abspath(__file__), os.path.abspath(duty_data.__file__)]
+    return f"{input_files_key(code_files + list(source_files))}\n{input_files_key(REPORT_FILES)}\n"
+
+def reports_up_to_date(source_files):
+    """True when the manifest matches the current inputs, code and report files"""
+    if not os.path.exists(MANIFEST_FILE) or not all(os.path.exists(f) for f in REPORT_FILES):
+        return False
+    with open(MANIFEST_FILE) as f:
+        return f.read() == reports_manifest(source_files)
+
+def summarize_person_days(df_sorted):
+    """
+    One row per (Name, Date) with the first duty on, last duty off
+    and the hours between them (NaN unless both exist). The min/max reductions do not
+    depend on row order; rows come out in order of each (Name, Date)'s first appearance.
+    """
+    grouped = df_sorted.groupby(['Name', 'Date'], sort=False)
+    group_ids = grouped.ngroup().to_numpy()
+    ts = df_sorted['DateTime'].to_numpy(dtype='datetime64[ns]')
+    is_on = df_sorted['is_on'].to_numpy()
+    is_off = df_sorted['is_off'].to_numpy()
+    
+    person_days = pd.DataFrame(index=grouped.size().index)
+    n_groups = len(person_days)
+    
+    # Earliest duty on and latest duty off per group, reduced in place over the group ids
+    # (fmin/fmax skip the NaT starting values, which stay NaT for groups without that status)
+    first_on = np.full(n_groups, np.datetime64('NaT'), dtype='datetime64[ns]')
+    last_off = first_on.copy()
+    np.fmin.at(first_on, group_ids[is_on], ts[is_on])
+    np.fmax.at(last_off, group_ids[is_off], ts[is_off])
+    
+    person_days['first_on'] = first_on
+    person_days['last_off'] = last_off
+    person_days['hours'] = (person_days['last_off'] - person_days['first_on']).dt.total_seconds() / 3600
+    return person_days
 
 def analyze_duty_schedule(csv_file_path):
     """
@@ -8,191 +65,161 @@ def analyze_duty_schedule(csv_file_path):
     """
     # Read the CSV file(s)
     print("Reading CSV file(s)...")
-    if isinstance(csv_file_path, (list, tuple)):
-        parts = [pd.read_csv(p, names=['ID', 'Name', 'Status', 'DateTime']) for p in csv_file_path]
-        df = pd.concat(parts, ignore_index=True)
-    else:
-        df = pd.read_csv(csv_file_path, names=['ID', 'Name', 'Status', 'DateTime'])
+    paths = csv_file_path if isinstance(csv_file_path, (list, tuple)) else [csv_file_path]
+    df = read_duty_csvs(paths)
     
-    # Convert DateTime to datetime object
-    df['DateTime'] = pd.to_datetime(df['DateTime'])
+    # DateTime is already parsed by Arrow; split out date and time
     df['Date'] = df['DateTime'].dt.date
     df['Time'] = df['DateTime'].dt.time
+    # Status flags computed once and reused by every report below ("Ot On" is neither)
+    df['is_on'] = df['Status'].eq('DutyOn')
+    df['is_off'] = df['Status'].eq('DutyOff')
     
     print(f"Total records: {len(df)}")
     print(f"Date range: {df['Date'].min()} to {df['Date'].max()}")
     print(f"Unique employees: {df['Name'].nunique()}")
     
-    # Sort by Name, Date, and DateTime
-    df_sorted = df.sort_values(['Name', 'Date', 'DateTime'])
+    # Sort by Name, Date, and DateTime (stable, so equal timestamps keep file order)
+    df_sorted = df.sort_values(['Name', 'Date', 'DateTime'], kind='mergesort')
     
-    # Create a summary by person and date
-    print("\n" + "="*80)
-    print("DUTY SCHEDULE ANALYSIS - BY PERSON AND DATE")
-    print("="*80)
+    # Per person and date stats, shared by the printed analysis and the CSV reports
+    person_days = summarize_person_days(df_sorted)
+    duty_hours = person_days['hours']
+    
+    # Build the printed report in memory and write it to stdout in one go
+    report = io.StringIO()
     
-    # Group by person
-    for name in sorted(df['Name'].unique()):
-        person_data = df_sorted[df_sorted['Name'] == name]
-        print(f"\n📋 Employee: {name.upper()}")
-        print("-" * 50)
+    # Create a summary by person and date
+    print("\n" + "="*80, file=report)
+    print("DUTY SCHEDULE ANALYSIS - BY PERSON AND DATE", file=report)
+    print("="*80, file=report)
+    
+    # One pass over the (person, date) groups of the sorted frame, in sorted order
+    current_name = None
+    for (name, date), date_data in df_sorted.groupby(['Name', 'Date'], sort=False):
+        if name != current_name:
+            current_name = name
+            print(f"\n📋 Employee: {name.upper()}", file=report)
+            print("-" * 50, file=report)
+        
+        print(f"\n📅 Date: {date}", file=report)
+        
+        duty_on_records = date_data[date_data['is_on']]
+        duty_off_records = date_data[date_data['is_off']]
         
-        # Group by date for this person
-        for date in sorted(person_data['Date'].unique()):
-            date_data = person_data[person_data['Date'] == date]
-            print(f"\n📅 Date: {date}")
-            
-            duty_on_records = date_data[date_data['Status'] == 'DutyOn']
-            duty_off_records = date_data[date_data['Status'] == 'DutyOff']
-            
-            if not duty_on_records.empty:
-                for _, record in duty_on_records.iterrows():
-                    print(f"  🟢 Duty ON:  {record['Time']}")
-            
-            if not duty_off_records.empty:
-                for _, record in duty_off_records.iterrows():
-                    print(f"  🔴 Duty OFF: {record['Time']}")
-            
-            # Calculate duty duration if both on and off exist
-            if not duty_on_records.empty and not duty_off_records.empty:
-                # Get the first duty on and last duty off of the day
-                first_on = duty_on_records.iloc[0]['DateTime']
-                last_off = duty_off_records.iloc[-1]['DateTime']
-                duration = last_off - first_on
-                hours = duration.total_seconds() / 3600
-                print(f"  ⏱️  Total duty time: {hours:.2f} hours")
+        report.writelines(f"  🟢 Duty ON:  {t}\n" for t in duty_on_records['Time'].to_numpy())
+        report.writelines(f"  🔴 Duty OFF: {t}\n" for t in duty_off_records['Time'].to_numpy())
+        
+        # Duty duration, when both a duty on and a duty off exist
+        hours = duty_hours.get((name, date))
+        if pd.notna(hours):
+            print(f"  ⏱️  Total duty time: {hours:.2f} hours", file=report)
     
     # Create a date-wise summary
-    print("\n\n" + "="*80)
-    print("DUTY SCHEDULE ANALYSIS - BY DATE")
-    print("="*80)
-    
-    for date in sorted(df['Date'].unique()):
-        date_data = df_sorted[df_sorted['Date'] == date]
-        print(f"\n📅 Date: {date}")
-        print("-" * 50)
+    print("\n\n" + "="*80, file=report)
+    print("DUTY SCHEDULE ANALYSIS - BY DATE", file=report)
+    print("="*80, file=report)
+    
+    # Sort once by date and time (stable, so ties keep name order) and walk the date groups in order
+    df_by_date = df_sorted.sort_values(['Date', 'DateTime'], kind='mergesort')
+    for date, date_data in df_by_date.groupby('Date', sort=False):
+        print(f"\n📅 Date: {date}", file=report)
+        print("-" * 50, file=report)
         
-        duty_on_data = date_data[date_data['Status'] == 'DutyOn'].sort_values('DateTime')
-        duty_off_data = date_data[date_data['Status'] == 'DutyOff'].sort_values('DateTime')
+        duty_on_data = date_data[date_data['is_on']]
+        duty_off_data = date_data[date_data['is_off']]
         
-        print("\n🟢 DUTY ON:")
-        for _, record in duty_on_data.iterrows():
-            print(f"  {record['Time']} - {record['Name']}")
+        print("\n🟢 DUTY ON:", file=report)
+        report.writelines(f"  {t} - {n}\n" for t, n in zip(duty_on_data['Time'].to_numpy(), duty_on_data['Name'].to_numpy()))
         
-        print("\n🔴 DUTY OFF:")
-        for _, record in duty_off_data.iterrows():
-            print(f"  {record['Time']} - {record['Name']}")
+        print("\n🔴 DUTY OFF:", file=report)
+        report.writelines(f"  {t} - {n}\n" for t, n in zip(duty_off_data['Time'].to_numpy(), duty_off_data['Name'].to_numpy()))
         
-        print(f"\n📊 Summary for {date}:")
-        print(f"  Total employees on duty: {len(duty_on_data)}")
-        print(f"  Total employees off duty: {len(duty_off_data)}")
+        print(f"\n📊 Summary for {date}:", file=report)
+        print(f"  Total employees on duty: {len(duty_on_data)}", file=report)
+        print(f"  Total employees off duty: {len(duty_off_data)}", file=report)
+    
+    sys.stdout.write(report.getvalue())
     
     # Create CSV reports
-    create_csv_reports(df_sorted)
+    create_csv_reports(df_sorted, paths, person_days, df_by_date)
 
-def create_csv_reports(df):
+def create_csv_reports(df, source_files=(), person_days=None, df_by_date=None):
     """
-    Create separate CSV files for different views of the data
+    Create separate CSV files for different views of the data.
+    df must be sorted by Name, Date, DateTime (as analyze_duty_schedule passes it).
     """
     print("\n" + "="*80)
     print("CREATING CSV REPORTS")
     print("="*80)
     
-    import os
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    
-    # 1. Person-wise duty schedule
-    person_schedule = []
-    for name in sorted(df['Name'].unique()):
-        person_data = df[df['Name'] == name].sort_values('DateTime')
-        for _, record in person_data.iterrows():
-            person_schedule.append({
-                'Name': record['Name'],
-                'Date': record['Date'],
-                'Status': record['Status'],
-                'Time': record['Time'],
-                'DateTime': record['DateTime']
-            })
-    
-    person_df = pd.DataFrame(person_schedule)
-    person_file = os.path.join(current_dir, 'duty_schedule_by_person.csv')
-    person_df.to_csv(person_file, index=False)
-    print("✅ Created: duty_schedule_by_person.csv")
-    
-    # 2. Date-wise duty schedule
-    date_schedule = []
-    for date in sorted(df['Date'].unique()):
-        date_data = df[df['Date'] == date].sort_values('DateTime')
-        for _, record in date_data.iterrows():
-            date_schedule.append({
-                'Date': record['Date'],
-                'Name': record['Name'],
-                'Status': record['Status'],
-                'Time': record['Time'],
-                'DateTime': record['DateTime']
-            })
-    
-    date_df = pd.DataFrame(date_schedule)
-    date_file = os.path.join(current_dir, 'duty_schedule_by_date.csv')
-    date_df.to_csv(date_file, index=False)
-    print("✅ Created: duty_schedule_by_date.csv")
-    
-    # 3. Daily summary
-    daily_summary = []
-    for date in sorted(df['Date'].unique()):
-        date_data = df[df['Date'] == date]
-        duty_on_count = len(date_data[date_data['Status'] == 'DutyOn'])
-        duty_off_count = len(date_data[date_data['Status'] == 'DutyOff'])
-        unique_employees = date_data['Name'].nunique()
+    # Skip the rewrite when the existing reports were built from the same inputs
+    if source_files and reports_up_to_date(source_files):
+        print("⏭️  Reports are up to date, skipping")
+        return
+    
+    # Invalidate the manifest first so a failed or partial write is never taken as up to date
+    if os.path.exists(MANIFEST_FILE):
+        os.remove(MANIFEST_FILE)
+    
+    # Each report is (file name, frame, columns to write)
+    # 1. Person-wise duty schedule: df is already in Name, DateTime order, so write its columns as-is
+    reports = [('duty_schedule_by_person.csv', df, ['Name', 'Date', 'Status', 'Time', 'DateTime'])]
+    
+    # 2. Date-wise duty schedule (same records, different sort order; reuse the caller's sort if given)
+    if df_by_date is None:
+        df_by_date = df.sort_values(['Date', 'DateTime'], kind='mergesort')
+    reports.append(('duty_schedule_by_date.csv', df_by_date, ['Date', 'Name', 'Status', 'Time', 'DateTime']))
+    
+    # 3. Daily summary: segment reductions over the date-sorted rows, one segment per date
+    dates = df_by_date['Date'].to_numpy()
+    names = df_by_date['Name'].to_numpy()
+    starts = np.flatnonzero(np.r_[True, dates[1:] != dates[:-1]])
+    ends = np.r_[starts[1:], len(dates)]
+    summary_df = pd.DataFrame({
+        'Date': dates[starts],
+        'Total_DutyOn': np.add.reduceat(df_by_date['is_on'].to_numpy(), starts, dtype=np.int64),
+        'Total_DutyOff': np.add.reduceat(df_by_date['is_off'].to_numpy(), starts, dtype=np.int64),
+        'Unique_Employees': [np.unique(names[start:end]).size for start, end in zip(starts, ends)],
+    })
+    reports.append(('daily_duty_summary.csv', summary_df, None))
+    
+    # 4. Employee work hours (approximate), for days with both a duty on and a duty off
+    if person_days is None:
+        person_days = summarize_person_days(df)
+    worked = person_days[person_days['hours'].notna()]
+    if not worked.empty:
+        hours_df = pd.DataFrame({
+            'Duty_On_Time': worked['first_on'].dt.time,
+            'Duty_Off_Time': worked['last_off'].dt.time,
+            # Python's round (correctly rounded) rather than Series.round, to keep the CSV values stable
+            'Work_Hours': [round(h, 2) for h in worked['hours']],
+        }).reset_index()
+        reports.append(('employee_work_hours.csv', hours_df, None))
+    
+    # The reports are independent, so write them concurrently (threads overlap the file I/O
+    # without copying the frames to other processes) and report them in the usual order
+    with ThreadPoolExecutor(max_workers=len(reports)) as pool:
+        futures = [pool.submit(frame.to_csv, os.path.join(CURRENT_DIR, name), columns=columns, index=False)
+                   for name, frame, columns in reports]
+        for (name, _, _), future in zip(reports, futures):
+            future.result()
+            print(f"✅ Created: {name}")
+    
+    if source_files and all(os.path.exists(f) for f in REPORT_FILES):
+        manifest = reports_manifest(source_files)
+        
+        def write_manifest(path):
+            with open(path, 'w') as f:
+                f.write(manifest)
         
-        daily_summary.append({
-            'Date': date,
-            'Total_DutyOn': duty_on_count,
-            'Total_DutyOff': duty_off_count,
-            'Unique_Employees': unique_employees
-        })
-    
-    summary_df = pd.DataFrame(daily_summary)
-    summary_file = os.path.join(current_dir, 'daily_duty_summary.csv')
-    summary_df.to_csv(summary_file, index=False)
-    print("✅ Created: daily_duty_summary.csv")
-    
-    # 4. Employee work hours (approximate)
-    work_hours = []
-    for name in sorted(df['Name'].unique()):
-        person_data = df[df['Name'] == name].sort_values('DateTime')
-        for date in sorted(person_data['Date'].unique()):
-            date_data = person_data[person_data['Date'] == date]
-            duty_on = date_data[date_data['Status'] == 'DutyOn']
-            duty_off = date_data[date_data['Status'] == 'DutyOff']
-            
-            if not duty_on.empty and not duty_off.empty:
-                first_on = duty_on.iloc[0]['DateTime']
-                last_off = duty_off.iloc[-1]['DateTime']
-                duration = last_off - first_on
-                hours = duration.total_seconds() / 3600
-                
-                work_hours.append({
-                    'Name': name,
-                    'Date': date,
-                    'Duty_On_Time': duty_on.iloc[0]['Time'],
-                    'Duty_Off_Time': duty_off.iloc[-1]['Time'],
-                    'Work_Hours': round(hours, 2)
-                })
-    
-    if work_hours:
-        hours_df = pd.DataFrame(work_hours)
-        hours_file = os.path.join(current_dir, 'employee_work_hours.csv')
-        hours_df.to_csv(hours_file, index=False)
-        print("✅ Created: employee_work_hours.csv")
+        replace_file(MANIFEST_FILE, write_manifest)
 
 if __name__ == "__main__":
-    import os, glob
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    pattern = os.path.join(current_dir, 'Untitled spreadsheet - Sheet*.csv')
-    files = sorted(glob.glob(pattern))
+    import glob
+    files = sorted(glob.glob(CSV_PATTERN))
     if not files:
-        print(f"Error: No input CSV files found matching {pattern}")
+        print(f"Error: No input CSV files found matching {CSV_PATTERN}")
     else:
         analyze_duty_schedule(files)
         print("\n" + "="*80)
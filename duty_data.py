@@ -0,0 +1,86 @@
+"""
+Shared loading helpers for the duty schedule scripts: the input CSV schema,
+the Arrow-based loader and the per-status count table
+"""
+import os
+import glob
+import hashlib
+import tempfile
+import pandas as pd
+import pyarrow as pa
+from pyarrow import csv as pacsv
+
+DAY_ORDER = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# Input CSVs have no header row; Status is dictionary-encoded so it loads as a Categorical
+# and DateTime ("YYYY-MM-DD HH:MM:SS") is pinned to Arrow's ISO-8601 parser, with no format inference
+CSV_READ_OPTIONS = pacsv.ReadOptions(column_names=['ID', 'Name', 'Status', 'DateTime'])
+CSV_CONVERT_OPTIONS = pacsv.ConvertOptions(column_types={
+    'ID': pa.int64(),
+    'Name': pa.string(),
+    'Status': pa.dictionary(pa.int32(), pa.string()),
+    'DateTime': pa.timestamp('ns'),
+}, timestamp_parsers=[pacsv.ISO8601])
+
+def read_duty_csvs(files):
+    """Parse the input CSVs with Arrow's multithreaded reader and concatenate them before converting"""
+    tables = [pacsv.read_csv(csv_file, read_options=CSV_READ_OPTIONS, convert_options=CSV_CONVERT_OPTIONS)
+              for csv_file in files]
+    return pa.concat_tables(tables).to_pandas(self_destruct=True)
+
+def add_date_time(df):
+    """Add Date and Time columns; Date stays a fixed-width datetime64 day rather than Python date objects"""
+    df['Date'] = df['DateTime'].values.astype('datetime64[D]')
+    df['Time'] = df['DateTime'].dt.time
+    return df
+
+def add_hour_and_weekday(df):
+    """Add Hour and DayOfWeek straight from the int64 nanosecond values (1970-01-01 was a Thursday)"""
+    ns = df['DateTime'].to_numpy(dtype='datetime64[ns]').view('int64')
+    df['Hour'] = ((ns // 3_600_000_000_000) % 24).astype('int8')
+    df['DayOfWeek'] = pd.Categorical.from_codes((ns // 86_400_000_000_000 + 3) % 7, categories=DAY_ORDER, ordered=True)
+    return df
+
+def status_crosstab(df, key):
+    """Count records per value of key and Status in a single pass (rows in order of first appearance)"""
+    counts = df.groupby([key, 'Status'], observed=True, sort=False).size().unstack('Status', fill_value=0)
+    for status in ('DutyOn', 'DutyOff'):
+        if status not in counts.columns:
+            counts[status] = 0
+    return counts
+
+def status_counts_long(counts, key):
+    """Long-form Count per key and Status for the charts; zero cells are dropped as a plain groupby size would"""
+    long_counts = counts.rename_axis(index=key, columns='Status').stack().rename('Count').reset_index()
+    return long_counts[long_counts['Count'] > 0]
+
+def status_counts_nonzero(counts, status):
+    """One status column of a crosstab without its zero cells, so charts only plot keys that had records"""
+    column = counts[status]
+    return column[column > 0]
+
+def input_files_key(files):
+    """Hash the path, modification time and size of every input file"""
+    stats = sorted((f, os.stat(f).st_mtime_ns, os.stat(f).st_size) for f in files)
+    return hashlib.sha1(repr(stats).encode()).hexdigest()
+
+def replace_file(path, write):
+    """Call write(tmp_path) on a temp file next to path, then atomically move it into place"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def remove_stale_files(pattern, keep):
+    """Delete every file matching pattern except keep; files still open elsewhere are left for a later rebuild"""
+    for stale in glob.glob(pattern):
+        if stale != keep:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
@@ -1,6 +1,11 @@
+import os
+import glob
+import numpy as np
 import pandas as pd
 import streamlit as st
 from datetime import datetime
+import duty_data
+from duty_data import read_duty_csvs, add_date_time, input_files_key, replace_file, remove_stale_files
 
 # Set page config
 st.set_page_config(
@@ -33,48 +38,113 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+CSV_PATTERN = os.path.join(CURRENT_DIR, 'Untitled spreadsheet - Sheet*.csv')
+CACHE_DIR = os.path.join(CURRENT_DIR, '.cache')
+
+def _build_cache(files, cache_path):
+    """Parse the input CSVs and save them, with derived columns, as a Feather file"""
+    df = add_date_time(read_duty_csvs(files))
+    # Status flags computed once and reused everywhere ("Ot On" is neither)
+    df['is_on'] = df['Status'].eq('DutyOn')
+    df['is_off'] = df['Status'].eq('DutyOff')
+    # Group each employee's rows together, in time order
+    df = df.sort_values(['Name', 'DateTime'], kind='stable', ignore_index=True)
+
+    # Write through a temp file so other sessions never read a half-written cache
+    replace_file(cache_path, lambda path: df.to_feather(path, compression='zstd'))
+    return df
+
+def data_token():
+    """Cheap cache key for the input data: each CSV's path, modification time and size"""
+    return tuple((f, os.stat(f).st_mtime_ns, os.stat(f).st_size) for f in sorted(glob.glob(CSV_PATTERN)))
+
 @st.cache_data
-def load_data():
+def load_data(token):
     """Load the duty schedule data"""
     try:
-        import os, glob
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        pattern = os.path.join(current_dir, 'Untitled spreadsheet - Sheet*.csv')
-        files = sorted(glob.glob(pattern))
+        files = [f for f, _, _ in token]
         if not files:
-            raise FileNotFoundError(f"No CSV files found matching: {pattern}")
+            raise FileNotFoundError(f"No CSV files found matching: {CSV_PATTERN}")
 
-        parts = []
-        for csv_file in files:
-            parts.append(pd.read_csv(csv_file, names=['ID', 'Name', 'Status', 'DateTime']))
-        df = pd.concat(parts, ignore_index=True)
-        df['DateTime'] = pd.to_datetime(df['DateTime'])
-        df['Date'] = df['DateTime'].dt.date
-        df['Time'] = df['DateTime'].dt.time
+        # The Feather cache is named after the exact set of inputs and code it was built from
+        code_files = [os.path.abspath(__file__), os.path.abspath(duty_data.__file__)]
+        cache_file = os.path.join(CACHE_DIR, f"employee-lookup-{input_files_key(code_files + files)}.feather")
+        if os.path.exists(cache_file):
+            df = pd.read_feather(cache_file)
+        else:
+            df = _build_cache(files, cache_file)
+            # Drop caches built from older inputs
+            remove_stale_files(os.path.join(CACHE_DIR, 'employee-lookup-*.feather'), cache_file)
 
-        return df
+        # Index by employee; rows are sorted by Name, so a selection is a binary-search slice
+        return df.set_index('Name', drop=False).rename_axis(None)
     except Exception as e:
         st.error(f"Error loading data: {e}")
         return None
 
+@st.cache_data
+def employee_stats(token):
+    """Per employee record and day counts and duty on/off totals, computed once per data load"""
+    df = load_data(token)
+    if df is None:
+        return None
+    return df.groupby(level=0, sort=False).agg(
+        records=('Date', 'size'), total_days=('Date', 'nunique'), duty_on=('is_on', 'sum'), duty_off=('is_off', 'sum'))
+
 def format_time_list(times):
     """Format a list of times for display"""
     if not times:
         return "No records"
     return ", ".join([str(t) for t in times])
 
+@st.cache_data
+def employee_names(token):
+    """Employee names in sorted order for the selector, computed once per data load"""
+    stats = employee_stats(token)
+    return [] if stats is None else stats.index.tolist()
+
+@st.cache_data
+def employee_daily(token):
+    """Per employee and date schedule rows, formatted for display, computed once per data load"""
+    df = load_data(token)
+    if df is None:
+        return None
+    keys = ['Name', 'Date']
+    on = df[df['is_on']].groupby(keys, sort=False)
+    off = df[df['is_off']].groupby(keys, sort=False)
+    
+    # Rows are sorted by Name and DateTime, so groups come out in schedule order
+    daily = df.groupby(keys, sort=False).size().to_frame('Total Records')
+    daily['Duty On'] = on['Time'].agg(lambda t: format_time_list(t.tolist()))
+    daily['Duty Off'] = off['Time'].agg(lambda t: format_time_list(t.tolist()))
+    daily = daily.fillna({'Duty On': "No records", 'Duty Off': "No records"})
+    
+    # Work duration from the first duty on to the last duty off, blank unless both exist
+    hours = (off['DateTime'].max() - on['DateTime'].min()).dt.total_seconds() / 3600
+    daily['Work Duration'] = hours.map('{:.2f} hours'.format, na_action='ignore')
+    daily['Work Duration'] = daily['Work Duration'].fillna("")
+    
+    daily = daily.reset_index()
+    daily['Day'] = daily['Date'].dt.strftime('%A')
+    daily['Date'] = daily['Date'].dt.strftime('%Y-%m-%d')
+    daily = daily[['Date', 'Day', 'Name', 'Duty On', 'Duty Off', 'Work Duration', 'Total Records']]
+    return daily.set_index('Name', drop=False).rename_axis(None)
+
 def main():
     st.title("👤 Employee Duty Schedule Lookup")
     st.markdown("Select an employee to view their complete duty schedule")
     st.markdown("---")
     
     # Load data
-    df = load_data()
+    # Every cached helper is keyed on the file token, so edits to the CSVs are picked up on rerun
+    token = data_token()
+    df = load_data(token)
     if df is None:
         return
     
     # Employee selection
-    employees = sorted(df['Name'].unique().tolist())
+    employees = employee_names(token)
     selected_employee = st.selectbox(
         "🔍 Select Employee Name:",
         options=[''] + employees,
@@ -84,7 +154,8 @@ def main():
     
     if selected_employee:
         # Filter data for selected employee
-        employee_data = df[df['Name'] == selected_employee].sort_values(['Date', 'DateTime'])
+        employee_data = df.loc[[selected_employee]]
+        stats = employee_stats(token).loc[selected_employee]
         
         if not employee_data.empty:
             # Employee summary
@@ -93,62 +164,25 @@ def main():
             with col1:
                 st.metric("👤 Employee", selected_employee)
             with col2:
-                st.metric("📅 Total Days", employee_data['Date'].nunique())
+                st.metric("📅 Total Days", int(stats['total_days']))
             with col3:
-                st.metric("✅ Duty On", len(employee_data[employee_data['Status'] == 'DutyOn']))
+                st.metric("✅ Duty On", int(stats['duty_on']))
             with col4:
-                st.metric("❌ Duty Off", len(employee_data[employee_data['Status'] == 'DutyOff']))
+                st.metric("❌ Duty Off", int(stats['duty_off']))
             
             st.markdown("---")
             
             # Create detailed schedule
             st.subheader(f"📋 Complete Duty Schedule for **{selected_employee}**")
             
-            # Group by date
-            schedule_records = []
-            
-            for date in sorted(employee_data['Date'].unique()):
-                date_data = employee_data[employee_data['Date'] == date].sort_values('DateTime')
-                
-                # Separate duty on and off records
-                duty_on_records = date_data[date_data['Status'] == 'DutyOn']
-                duty_off_records = date_data[date_data['Status'] == 'DutyOff']
-                
-                # Get times
-                duty_on_times = duty_on_records['Time'].tolist()
-                duty_off_times = duty_off_records['Time'].tolist()
-                
-                # Calculate work duration
-                work_duration = ""
-                if duty_on_times and duty_off_times:
-                    first_on = duty_on_records.iloc[0]['DateTime']
-                    last_off = duty_off_records.iloc[-1]['DateTime']
-                    duration = last_off - first_on
-                    hours = duration.total_seconds() / 3600
-                    work_duration = f"{hours:.2f} hours"
-                
-                schedule_records.append({
-                    'Date': date.strftime('%Y-%m-%d'),
-                    'Day': date.strftime('%A'),
-                    'Name': selected_employee,
-                    'Duty On': format_time_list(duty_on_times),
-                    'Duty Off': format_time_list(duty_off_times),
-                    'Work Duration': work_duration,
-                    'Total Records': len(date_data)
-                })
-            
-            # Display as table
-            schedule_df = pd.DataFrame(schedule_records)
+            schedule_df = employee_daily(token).loc[[selected_employee]].reset_index(drop=True)
             
-            # Style the dataframe
-            def highlight_duty(val):
-                if 'No records' in str(val):
-                    return 'color: #6c757d; font-style: italic;'
-                elif ':' in str(val):  # Time format
-                    return 'font-weight: bold;'
-                return ''
+            # Style the dataframe, one vectorized pass per column
+            def highlight_duty(col):
+                return np.where(col.str.contains('No records', regex=False), 'color: #6c757d; font-style: italic;',
+                                np.where(col.str.contains(':', regex=False), 'font-weight: bold;', ''))  # Time format
             
-            styled_df = schedule_df.style.map(highlight_duty, subset=['Duty On', 'Duty Off'])
+            styled_df = schedule_df.style.apply(highlight_duty, subset=['Duty On', 'Duty Off'])
             
             st.dataframe(styled_df, width='stretch', hide_index=True)
             
@@ -169,9 +203,9 @@ def main():
             
             with col1:
                 st.markdown("### 📈 Statistics")
-                total_days = employee_data['Date'].nunique()
-                total_duty_on = len(employee_data[employee_data['Status'] == 'DutyOn'])
-                total_duty_off = len(employee_data[employee_data['Status'] == 'DutyOff'])
+                total_days = int(stats['total_days'])
+                total_duty_on = int(stats['duty_on'])
+                total_duty_off = int(stats['duty_off'])
                 
                 st.write(f"• **Total Working Days:** {total_days}")
                 st.write(f"• **Total Duty On Records:** {total_duty_on}")
@@ -184,20 +218,20 @@ def main():
                 last_date = employee_data['Date'].max()
                 date_range = (last_date - first_date).days
                 
-                st.write(f"• **First Record:** {first_date}")
-                st.write(f"• **Last Record:** {last_date}")
+                st.write(f"• **First Record:** {first_date:%Y-%m-%d}")
+                st.write(f"• **Last Record:** {last_date:%Y-%m-%d}")
                 st.write(f"• **Date Range:** {date_range} days")
                 
                 # Most common duty on hour
-                if not employee_data[employee_data['Status'] == 'DutyOn'].empty:
-                    common_hour = employee_data[employee_data['Status'] == 'DutyOn']['DateTime'].dt.hour.mode()
+                if employee_data['is_on'].any():
+                    common_hour = employee_data.loc[employee_data['is_on'], 'DateTime'].dt.hour.mode()
                     if len(common_hour) > 0:
                         st.write(f"• **Most Common Duty On Hour:** {common_hour.iloc[0]}:00")
             
             # Recent activity
             st.markdown("### 🕒 Recent Activity (Last 5 records)")
             recent_records = employee_data.tail(5)[['Date', 'Status', 'Time']].copy()
-            recent_records['Date'] = recent_records['Date'].astype(str)
+            recent_records['Date'] = recent_records['Date'].dt.strftime('%Y-%m-%d')
             st.dataframe(recent_records, width='stretch', hide_index=True)
             
         else:
@@ -209,13 +243,12 @@ def main():
         # Show available employees
         if df is not None:
             st.markdown("### 👥 Available Employees")
-            employees = sorted(df['Name'].unique().tolist())
+            record_counts = employee_stats(token)['records']
             
             # Display in columns
             cols = st.columns(3)
-            for i, emp in enumerate(employees):
+            for i, (emp, record_count) in enumerate(record_counts.items()):
                 with cols[i % 3]:
-                    record_count = len(df[df['Name'] == emp])
                     st.write(f"• **{emp}** ({record_count} records)")
 
 if __name__ == "__main__":